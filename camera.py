@@ -0,0 +1,86 @@
+import pygame
+
+from spatial_grid import SpatialGrid
+
+
+class Camera:
+    def __init__(self, width: int, height: int, world_rect: pygame.Rect = None, smoothing: float = 10.0):
+        """
+        Viewport into the world that follows a target.
+
+        Args:
+            width, height: Size of the visible area in pixels
+            world_rect: Optional world bounds the view is clamped to
+            smoothing: How fast the camera catches up with its target (per second),
+                0 snaps to the target every frame
+        """
+        self.width = width
+        self.height = height
+        self.world_rect = world_rect
+        self.smoothing = smoothing
+        self.x = 0.0
+        self.y = 0.0
+
+    @property
+    def offset(self) -> tuple[int, int]:
+        """Integer top-left of the view, used for drawing so tiles don't shimmer"""
+        return round(self.x), round(self.y)
+
+    @property
+    def view_rect(self) -> pygame.Rect:
+        """Visible area in world coordinates"""
+        ox, oy = self.offset
+        return pygame.Rect(ox, oy, self.width, self.height)
+
+    def center_on(self, pos: tuple[float, float]):
+        self.x = pos[0] - self.width / 2
+        self.y = pos[1] - self.height / 2
+        self._clamp()
+
+    def follow(self, target_pos: tuple[float, float], dt: float):
+        """Ease the view towards being centered on target_pos"""
+        goal_x = target_pos[0] - self.width / 2
+        goal_y = target_pos[1] - self.height / 2
+        if self.smoothing <= 0:
+            self.x, self.y = goal_x, goal_y
+        else:
+            t = min(1.0, self.smoothing * dt)
+            self.x += (goal_x - self.x) * t
+            self.y += (goal_y - self.y) * t
+        self._clamp()
+
+    def _clamp(self):
+        if self.world_rect is None:
+            return
+        # Center worlds smaller than the view instead of clamping them
+        if self.world_rect.width <= self.width:
+            self.x = self.world_rect.centerx - self.width / 2
+        else:
+            self.x = max(self.world_rect.left, min(self.x, self.world_rect.right - self.width))
+        if self.world_rect.height <= self.height:
+            self.y = self.world_rect.centery - self.height / 2
+        else:
+            self.y = max(self.world_rect.top, min(self.y, self.world_rect.bottom - self.height))
+
+    def world_to_screen(self, pos: tuple[float, float]) -> tuple[float, float]:
+        ox, oy = self.offset
+        return pos[0] - ox, pos[1] - oy
+
+    def screen_to_world(self, pos: tuple[float, float]) -> tuple[float, float]:
+        ox, oy = self.offset
+        return pos[0] + ox, pos[1] + oy
+
+    def apply(self, rect: pygame.Rect) -> pygame.Rect:
+        """Copy of a world rect moved into screen space"""
+        ox, oy = self.offset
+        return rect.move(-ox, -oy)
+
+    def query(self, grid: SpatialGrid, margin: int = 0) -> list:
+        """
+        Items of a spatial grid inside the view.
+
+        Args:
+            grid: Index of blocks or enemies keyed by their bounding rect
+            margin: Extra pixels around the view to include
+        """
+        return grid.query_rect(self.view_rect.inflate(margin * 2, margin * 2))
@@ -0,0 +1,16 @@
+import json
+import pygame
+
+from models.block import Block
+
+
+def load_blocks(path: str, tile_size: int) -> list[pygame.Rect]:
+    """Load a level saved by the editor as a list of block rects"""
+    blocks = []
+    with open(path, 'r') as file:
+        level = json.load(file)
+        for item in level:
+            x, y = map(int, item.split(";"))
+            cell = Block(x * tile_size, y * tile_size, tile_size)
+            blocks.append(cell.rect)  # We just need the rects for FOV
+    return blocks
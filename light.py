@@ -5,13 +5,34 @@ import pygame
 from math import atan2, cos, sin, floor
 from typing import List, Tuple
 
+# Rotated attenuation textures are cached per facing bucket instead of rotating every frame
+ATTENUATION_ANGLE_STEPS = 64
+# Angular width (degrees) over which the cone fades in from its edges
+PENUMBRA_DEGREES = 10
+# Furthest the player moves in one frame: Player.speed (200 px/s) times main.py's 0.1s dt clamp
+MAX_FRAME_MOVEMENT = 20
+# _cast_ray_dda samples points up to about a pixel off the ray and counts block
+# edges as inside, so revalidated rays keep this many pixels clear of blocks
+RAY_SLOP = 2
+
+# The player's light in main.py; replay.py builds the same one so replayed frames cost the same
+PLAYER_LIGHT_SETTINGS = {
+    "fov_angle": 90,
+    "view_distance": 90,
+    "grid_size": 64,
+    "incremental": True,
+}
+
 class LightSystem:
     def __init__(self, blocks: List[pygame.Rect], 
                  fov_angle: float = 90, 
                  base_ray_count: int = 60,
                  view_distance: int = 200,
                  ray_density: float = 0.5,
-                 grid_size: int = 64):
+                 grid_size: int = 64,
+                 soft_light: bool = True,
+                 incremental: bool = False,
+                 reuse_distance: float = MAX_FRAME_MOVEMENT):
         """
         Initialize the Field of View system with ray casting.
         
@@ -22,6 +43,11 @@ class LightSystem:
             view_distance: Maximum view distance in pixels
             ray_density: Rays per pixel at max distance
             grid_size: Size of spatial partitioning grid cells
+            soft_light: Use radial falloff and penumbra textures instead of a flat cone
+            incremental: Reuse last frame's ray hits where they can't have changed.
+                Ray angles snap to whole ray slots so turning shifts the window
+            reuse_distance: Max origin movement (pixels) for which hits are revalidated
+                instead of recast, by default the most the player moves in a frame
         """
         self.blocks = blocks
         self.fov_angle = fov_angle
@@ -29,6 +55,17 @@ class LightSystem:
         self.view_distance = view_distance
         self.ray_density = ray_density
         self.grid_size = grid_size
+        self.soft_light = soft_light
+        self.incremental = incremental
+        self.reuse_distance = reuse_distance
+        self.center_angle = 0
+        
+        # Last frame's ray hits by slot (angle = slot * step), for incremental mode
+        self._ray_cache = None
+        
+        # Attenuation textures, rebuilt only when light parameters change
+        self._attenuation_key = None
+        self._attenuation_textures = {}
         
         # Initialize spatial partitioning
         self.grid = {}
@@ -71,6 +108,18 @@ class LightSystem:
                     nearby_blocks.extend(self.grid[(gx, gy)])
         return nearby_blocks
     
+    def _get_blocks_in_rect(self, rect: pygame.Rect) -> List[pygame.Rect]:
+        """Blocks in grid cells overlapping rect, without duplicates"""
+        seen = set()
+        nearby_blocks = []
+        for gx in range(floor(rect.left / self.grid_size), floor(rect.right / self.grid_size) + 1):
+            for gy in range(floor(rect.top / self.grid_size), floor(rect.bottom / self.grid_size) + 1):
+                for block in self.grid.get((gx, gy), ()):
+                    if id(block) not in seen:
+                        seen.add(id(block))
+                        nearby_blocks.append(block)
+        return nearby_blocks
+    
     def _cast_ray_dda(self, origin: Tuple[float, float], angle: float) -> Tuple[float, float]:
         """Digital Differential Analyzer algorithm for ray casting"""
         x, y = origin
@@ -138,6 +187,7 @@ class LightSystem:
             center_angle = facing_angle
         else:
             center_angle = 0  # Default to right
+        self.center_angle = center_angle
         
         # Dynamic ray count based on distance to walls
         ray_count = min(self.base_ray_count + int(self.view_distance * self.ray_density), 200)
@@ -145,26 +195,153 @@ class LightSystem:
         # Convert FOV angle to radians and get half angle for spread
         half_fov = math.radians(self.fov_angle) / 2
         
+        if self.incremental:
+            hits = self._calculate_hits_incremental(player_pos, center_angle, half_fov, ray_count)
+        else:
+            hits = []
+            for i in range(ray_count):
+                # Calculate angle for this ray
+                # This spreads the rays evenly across the FOV angle
+                       #facing         start of cone            fraction added to move    
+                angle = center_angle - half_fov + (2 * half_fov * i / max(1, ray_count-1))
+                
+                # Cast ray using DDA algorithm
+                hits.append(self._cast_ray_dda(player_pos, angle))
+        
         rays = []
         visible_blocks = []
-        for i in range(ray_count):
-            # Calculate angle for this ray
-            # This spreads the rays evenly across the FOV angle
-                   #facing         start of cone            fraction added to move    
-            angle = center_angle - half_fov + (2 * half_fov * i / max(1, ray_count-1))
-            
-            # Cast ray using DDA algorithm
-            end_point, hit_blocks = self._cast_ray_dda(player_pos, angle)
+        seen = set()  # Rects aren't hashable, so dedupe by identity
+        for end_point, hit_blocks in hits:
             rays.append((player_pos, end_point))
             for block in hit_blocks:
-                if block not in visible_blocks:  # Manual duplicate check
+                if id(block) not in seen:
+                    seen.add(id(block))
                     visible_blocks.append(block)
             
         return rays, visible_blocks
     
+    def _calculate_hits_incremental(self, player_pos: Tuple[float, float], center_angle: float,
+                                    half_fov: float, ray_count: int) -> List:
+        """Cast rays on whole angular slots, reusing cached hits that are still valid"""
+        step = 2 * half_fov / max(1, ray_count - 1)
+        first_slot = round((center_angle - half_fov) / step) if step > 0 else 0
+        
+        cache = self._ray_cache
+        old_hits = {}
+        moved = False
+        if cache is not None and cache["step"] == step:
+            moved = cache["origin"] != player_pos
+            if math.dist(cache["origin"], player_pos) <= self.reuse_distance:
+                old_hits = cache["hits"]
+        
+        hits = []
+        new_hits = {}
+        for slot in range(first_slot, first_slot + ray_count):
+            angle = slot * step
+            hit = old_hits.get(slot)
+            if hit is not None and moved:
+                hit = self._revalidate_hit(player_pos, angle, hit)
+            if hit is None:
+                hit = self._cast_ray_dda(player_pos, angle)
+            hits.append(hit)
+            new_hits[slot] = hit
+        
+        self._ray_cache = {"origin": player_pos, "step": step, "hits": new_hits}
+        return hits
+    
+    def _revalidate_hit(self, origin: Tuple[float, float], angle: float, hit: Tuple) -> Tuple:
+        """
+        Move a cached ray to a new origin without recasting it.
+        
+        The ray keeps its target if it still runs into the same block (or still
+        misses) and no other block comes within RAY_SLOP pixels of it on the way,
+        so a fresh cast would stop at the same point.
+        
+        Returns:
+            The updated hit, or None if the ray has to be recast
+        """
+        _, hit_blocks = hit
+        ray_cos, ray_sin = cos(angle), sin(angle)
+        if hit_blocks:
+            target = hit_blocks[0]
+            end = self._cast_ray_at_block(origin, angle, target)
+            if end is None:
+                return None
+            # Also past the end point, where a fresh cast could stop on a neighbouring block instead
+            clear_to = (end[0] + ray_cos * RAY_SLOP, end[1] + ray_sin * RAY_SLOP)
+        else:
+            end = (origin[0] + ray_cos * self.view_distance, origin[1] + ray_sin * self.view_distance)
+            # The DDA's last step can land a little past view_distance
+            clear_to = (end[0] + ray_cos * RAY_SLOP, end[1] + ray_sin * RAY_SLOP)
+        
+        bounds = pygame.Rect(floor(min(origin[0], clear_to[0])) - RAY_SLOP, floor(min(origin[1], clear_to[1])) - RAY_SLOP,
+                             floor(abs(clear_to[0] - origin[0])) + 2 * RAY_SLOP + 2, floor(abs(clear_to[1] - origin[1])) + 2 * RAY_SLOP + 2)
+        for block in self._get_blocks_in_rect(bounds):
+            if hit_blocks and block is target:
+                continue
+            if block.inflate(2 * RAY_SLOP, 2 * RAY_SLOP).clipline(origin, clear_to):
+                return None
+        return (end, hit_blocks)
+    
+    def _cast_ray_at_block(self, origin: Tuple[float, float], angle: float, block: pygame.Rect) -> Tuple[float, float]:
+        """
+        Where _cast_ray_dda would stop on block if nothing else were in the way.
+        
+        Same walk and arithmetic as _cast_ray_dda, so the point matches a fresh
+        cast exactly, but without looking up blocks at every step.
+        
+        Returns:
+            The hit point, or None if the ray doesn't reach block within view_distance
+        """
+        x, y = origin
+        ray_cos, ray_sin = cos(angle), sin(angle)
+        step_x = 1 if ray_cos >= 0 else -1
+        step_y = 1 if ray_sin >= 0 else -1
+        t_delta_x = abs(1 / ray_cos) if ray_cos != 0 else float('inf')
+        t_max_x = abs((floor(x) + (1 if step_x > 0 else 0) - x) / ray_cos) if ray_cos != 0 else float('inf')
+        t_delta_y = abs(1 / ray_sin) if ray_sin != 0 else float('inf')
+        t_max_y = abs((floor(y) + (1 if step_y > 0 else 0) - y) / ray_sin) if ray_sin != 0 else float('inf')
+        left, right, top, bottom = block.left, block.right, block.top, block.bottom
+        
+        current_distance = 0
+        last_x, last_y = x, y
+        while current_distance < self.view_distance:
+            if t_max_x < t_max_y:
+                last_x += step_x
+                current_distance = t_max_x
+                t_max_x += t_delta_x
+            else:
+                last_y += step_y
+                current_distance = t_max_y
+                t_max_y += t_delta_y
+            if left <= last_x <= right and top <= last_y <= bottom:
+                return (last_x, last_y)
+        return None
+    
+    def check_incremental(self, tolerance: float = 0) -> List[Tuple[int, Tuple[float, float], Tuple[float, float]]]:
+        """
+        Recast the last incremental frame from scratch and compare ray ends.
+        
+        Args:
+            tolerance: Distance (pixels) a reused ray end may be from a fresh cast's
+        
+        Returns:
+            (slot, reused end, fresh end) for every ray further off than tolerance
+        """
+        cache = self._ray_cache
+        if cache is None:
+            return []
+        mismatches = []
+        for slot, (end, _) in cache["hits"].items():
+            fresh_end, _ = self._cast_ray_dda(cache["origin"], slot * cache["step"])
+            if math.dist(end, fresh_end) > tolerance:
+                mismatches.append((slot, end, fresh_end))
+        return mismatches
+    
     def update_blocks(self, new_blocks: List[pygame.Rect]):
         """Update the blocking geometry (call when level changes)"""
         self.blocks = new_blocks
+        self._ray_cache = None
         self._init_spatial_partition()
     
     def toggle_light(self):
@@ -197,8 +374,69 @@ class LightSystem:
             # When light, produce dramatic flickering (40-120)
             base = random.randrange(110, 120)
             return base
-    def create_combined_lighting(self, size: Tuple[int, int], rays: List, player_pos: Tuple[float, float], lightframes: int=500, darkframes: int=100):
-        """Optimized combined lighting with pre-allocation"""
+    def _build_attenuation_texture(self, light_color: Tuple[int, int, int]) -> pygame.Surface:
+        """Radial falloff with soft cone edges, facing right (angle 0)"""
+        radius = max(1, int(self.view_distance))
+        size = radius * 2
+        texture = pygame.Surface((size, size), pygame.SRCALPHA)
+        texture.fill((*light_color, 0))
+        
+        # Concentric discs from the outside in, intensity = (1 - d^2/r^2)^2
+        for r in range(radius, 0, -1):
+            falloff = 1 - (r / radius) ** 2
+            pygame.draw.circle(texture, (*light_color, int(255 * falloff * falloff)), (radius, radius), r)
+        
+        if self.fov_angle >= 360:
+            return texture
+        
+        # Angular penumbra: fade in over the outer PENUMBRA_DEGREES of the cone
+        half_fov = self.fov_angle / 2
+        penumbra = min(PENUMBRA_DEGREES, half_fov)
+        wedges = pygame.Surface((size, size), pygame.SRCALPHA)
+        reach = radius * 1.5  # far enough to cover the texture's corners
+        step = 1
+        angle = -half_fov
+        while angle < half_fov:
+            next_angle = min(half_fov, angle + step)
+            middle = (angle + next_angle) / 2
+            edge_distance = half_fov - abs(middle)
+            weight = min(1.0, edge_distance / penumbra) if penumbra > 0 else 1.0
+            points = [(radius, radius)]
+            for a in (angle, next_angle):
+                points.append((radius + cos(math.radians(a)) * reach, radius + sin(math.radians(a)) * reach))
+            pygame.draw.polygon(wedges, (255, 255, 255, int(255 * weight)), points)
+            angle = next_angle
+        texture.blit(wedges, (0, 0), special_flags=pygame.BLEND_RGBA_MULT)
+        return texture
+    
+    def _get_attenuation_texture(self, light_color: Tuple[int, int, int], facing_angle: float) -> Tuple[pygame.Surface, Tuple[int, int]]:
+        """
+        Cached attenuation texture rotated to the nearest facing bucket.
+        
+        Returns:
+            The texture cropped to the lit cone, and its top-left relative to the light origin
+        """
+        key = (self.view_distance, tuple(light_color), self.fov_angle)
+        if key != self._attenuation_key:
+            self._attenuation_key = key
+            self._attenuation_textures = {None: self._build_attenuation_texture(light_color)}
+        
+        bucket = round(facing_angle / (2 * math.pi) * ATTENUATION_ANGLE_STEPS) % ATTENUATION_ANGLE_STEPS
+        if bucket not in self._attenuation_textures:
+            # pygame rotates counterclockwise on screen, our angles are clockwise (y down)
+            degrees = -bucket * 360 / ATTENUATION_ANGLE_STEPS
+            rotated = pygame.transform.rotate(self._attenuation_textures[None], degrees)
+            # Crop to the cone so the cache stays small and per-frame blits only touch lit pixels
+            bounds = rotated.get_bounding_rect()
+            if bounds.width == 0 or bounds.height == 0:
+                bounds = pygame.Rect(0, 0, 1, 1)
+            offset = (bounds.x - rotated.get_width() // 2, bounds.y - rotated.get_height() // 2)
+            self._attenuation_textures[bucket] = (rotated.subsurface(bounds).copy(), offset)
+        return self._attenuation_textures[bucket]
+    
+    def create_combined_lighting(self, size: Tuple[int, int], rays: List, player_pos: Tuple[float, float], lightframes: int=500, darkframes: int=100,
+                                 light_color: Tuple[int, int, int] = (255, 255, 255), facing_angle: float = None):
+        """Optimized combined lighting with pre-allocation (facing_angle defaults to the last calculate_rays call)"""
         if not hasattr(self, '_combined_lighting') or size != self._combined_lighting.get_size():
             self._combined_lighting = pygame.Surface(size, pygame.SRCALPHA)
             self._light_cone = pygame.Surface(size, pygame.SRCALPHA)
@@ -218,12 +456,35 @@ class LightSystem:
             # Draw directly to surfaces
             
             alpha = self.create_light_flicker(lightframes=lightframes, darkframes=darkframes)
+            if self.soft_light:
+                if facing_angle is None:
+                    facing_angle = self.center_angle
+                return self._soft_lighting(player_pos, points, alpha, light_color, facing_angle)
             # actual visiblity (alpha = 0 visible)
             pygame.draw.polygon(self._combined_lighting, (0, 0, 0,  255-alpha), [player_pos] + points)
             # light cone only effect (alpha=255 visible)
-            pygame.draw.polygon(self._light_cone, (255, 255, 255, alpha), [player_pos] + points) 
+            pygame.draw.polygon(self._light_cone, (*light_color, alpha), [player_pos] + points) 
         
         # Combine
         self._combined_lighting.blit(self._light_cone, (0, 0))
         return self._combined_lighting
+    
+    def _soft_lighting(self, player_pos: Tuple[float, float], points: List, alpha: int, light_color: Tuple[int, int, int], facing_angle: float):
+        """Mask the cached attenuation texture with the visibility polygon (surfaces already cleared)"""
+        texture, offset = self._get_attenuation_texture(light_color, facing_angle)
+        area = texture.get_rect(topleft=(round(player_pos[0]) + offset[0], round(player_pos[1]) + offset[1]))
+        
+        # Visibility polygon as an opaque mask, multiplied by the falloff and the flicker.
+        # Clipped to the texture area so no polygon pixel escapes the falloff.
+        clip = self._light_cone.get_clip()
+        self._light_cone.set_clip(area)
+        pygame.draw.polygon(self._light_cone, (255, 255, 255, 255), [player_pos] + points)
+        self._light_cone.set_clip(clip)
+        self._light_cone.blit(texture, area, special_flags=pygame.BLEND_RGBA_MULT)
+        self._light_cone.fill((255, 255, 255, alpha), area, special_flags=pygame.BLEND_RGBA_MULT)
+        
+        # Darkness alpha = 255 - light alpha, then the tinted cone on top
+        self._combined_lighting.blit(self._light_cone, area, area, special_flags=pygame.BLEND_RGBA_SUB)
+        self._combined_lighting.blit(self._light_cone, area, area)
+        return self._combined_lighting
     
\ No newline at end of file
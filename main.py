@@ -1,11 +1,24 @@
-import json
+import argparse
 import math
+import random
+import time
 import pygame
 from fov_systems import RadialFOVSystem
 from models.enemy import Enemy
 from models.player import Player
-from models.block import Block
-from light import LightSystem
+from light import LightSystem, PLAYER_LIGHT_SETTINGS
+from camera import Camera
+from spatial_grid import SpatialGrid
+from level import load_blocks
+from replay import InputRecorder
+from visibility_pipeline import VisibilityPipeline, VisibilitySnapshot
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--record", help="Write this session's input to a file for replay.py")
+parser.add_argument("--seed", type=int, help="Random seed (defaults to the current time)")
+parser.add_argument("--pipeline", choices=["sync", "thread", "process"], default="sync",
+                    help="Where lighting and enemy visibility are computed (thread and process run one frame behind)")
+args = parser.parse_args()
 
 # Initialize pygame
 pygame.init()
@@ -14,6 +27,12 @@ pygame.init()
 WINDOW_WIDTH, WINDOW_HEIGHT = 640, 360
 TILE_SIZE = 16
 FPS = 60
+LEVEL_PATH = "levels/map.json"
+
+# Seed explicitly so recorded sessions can be replayed deterministically
+# Masked so any --seed (negative or huge) fits the recording header and replays identically
+seed = (args.seed if args.seed is not None else time.time_ns()) & 0xFFFFFFFF
+random.seed(seed)
 
 # Pygame setup
 window = pygame.display.set_mode((WINDOW_WIDTH, WINDOW_HEIGHT))
@@ -27,13 +46,19 @@ player = Player(WINDOW_HEIGHT // 2 - 16 // 2, WINDOW_WIDTH // 2 - 16 // 2, fov_s
 moving = {"left": False, "right": False, "up": False, "down": False}
 
 # Load level from JSON
-blocks = []
-with open("levels/map.json", 'r') as file:
-    level = json.load(file)
-    for item in level:
-        x, y = map(int, item.split(";"))
-        cell = Block(x * TILE_SIZE, y * TILE_SIZE, TILE_SIZE)
-        blocks.append(cell.rect)  # We just need the rects for FOV
+blocks = load_blocks(LEVEL_PATH, TILE_SIZE)
+
+# Spatial indices so per-frame work only touches what's on screen
+block_grid = SpatialGrid(TILE_SIZE * 4)
+for block in blocks:
+    block_grid.insert(block, block)
+
+# World bounds: the level, but never smaller than the window
+world_rect = pygame.Rect(0, 0, WINDOW_WIDTH, WINDOW_HEIGHT)
+if blocks:
+    world_rect = world_rect.unionall(blocks)
+camera = Camera(WINDOW_WIDTH, WINDOW_HEIGHT, world_rect)
+camera.center_on(player.playerRect.center)
 
 # Initialize FOV system
 # fov_system = LightSystem(
@@ -48,72 +73,114 @@ running = True
 dt = 0.1
 darkness_surface = pygame.Surface((WINDOW_WIDTH, WINDOW_HEIGHT), pygame.SRCALPHA)
 light_surface = pygame.Surface((WINDOW_WIDTH, WINDOW_HEIGHT), pygame.SRCALPHA)
-enemy = Enemy(30,30, TILE_SIZE) 
-while running:
-    # Handle events
-    for event in pygame.event.get():
-        if event.type == pygame.QUIT:
-            running = False
-        elif event.type == pygame.KEYDOWN:
-            if event.key == pygame.K_ESCAPE:
+enemies = [Enemy(30,30, TILE_SIZE)]
+enemy_grid = SpatialGrid(TILE_SIZE * 4)
+for enemy in enemies:
+    enemy_grid.insert(enemy, enemy.rect)
+
+# Lighting and enemy visibility, on this thread or (one frame behind) in a worker.
+# Fixed lag: enemy AI always sees exactly the frame's visibility from that many
+# frames ago, so it doesn't depend on worker timing and replay.py can reproduce it
+light_system = LightSystem(blocks=blocks, **PLAYER_LIGHT_SETTINGS)
+pipeline = VisibilityPipeline(light_system, fov_system, mode=args.pipeline,
+                              max_staleness=0 if args.pipeline == "sync" else 1, fixed_lag=True)
+frame = 0
+
+recorder = None
+if args.record:
+    recorder = InputRecorder(args.record, seed, (WINDOW_WIDTH, WINDOW_HEIGHT), TILE_SIZE, LEVEL_PATH,
+                             (player.x, player.y), [(enemy.x, enemy.y) for enemy in enemies],
+                             pipeline_mode=args.pipeline, pipeline_lag=pipeline.max_staleness)
+try:
+    while running:
+        # Handle events
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
                 running = False
-            elif event.key in [pygame.K_LEFT, pygame.K_a]:
-                moving["left"] = True
-            elif event.key in [pygame.K_RIGHT, pygame.K_d]:
-                moving["right"] = True
-            elif event.key in [pygame.K_UP, pygame.K_w]:
-                moving["up"] = True
-            elif event.key in [pygame.K_DOWN, pygame.K_s]:
-                moving["down"] = True
-            # elif event.key == pygame.K_z:
-            #     fov_system.toggle_light()
+            elif event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_ESCAPE:
+                    running = False
+                elif event.key in [pygame.K_LEFT, pygame.K_a]:
+                    moving["left"] = True
+                elif event.key in [pygame.K_RIGHT, pygame.K_d]:
+                    moving["right"] = True
+                elif event.key in [pygame.K_UP, pygame.K_w]:
+                    moving["up"] = True
+                elif event.key in [pygame.K_DOWN, pygame.K_s]:
+                    moving["down"] = True
+                # elif event.key == pygame.K_z:
+                #     fov_system.toggle_light()
             
-        elif event.type == pygame.KEYUP:
-            if event.key in [pygame.K_LEFT, pygame.K_a]:
-                moving["left"] = False
-            elif event.key in [pygame.K_RIGHT, pygame.K_d]:
-                moving["right"] = False
-            elif event.key in [pygame.K_UP, pygame.K_w]:
-                moving["up"] = False
-            elif event.key in [pygame.K_DOWN, pygame.K_s]:
-                moving["down"] = False
-
-    # Clear screen
-    window.fill((0, 0, 0))
-   
+            elif event.type == pygame.KEYUP:
+                if event.key in [pygame.K_LEFT, pygame.K_a]:
+                    moving["left"] = False
+                elif event.key in [pygame.K_RIGHT, pygame.K_d]:
+                    moving["right"] = False
+                elif event.key in [pygame.K_UP, pygame.K_w]:
+                    moving["up"] = False
+                elif event.key in [pygame.K_DOWN, pygame.K_s]:
+                    moving["down"] = False
 
+        # Clear screen
+        window.fill((0, 0, 0))
+   
+        camera.follow(player.playerRect.center, dt)
 
-    # Draw blocks only in visible area
-    # view_rect = pygame.Rect(player.x - 300, player.y - 200, 600, 400)
-    for block in blocks:
-        # if view_rect.colliderect(block):
-            pygame.draw.rect(window, (255, 255, 255), block)
-    # Calculate FOV with optimized ray count
-    # visible_blocks = fov_system._get_blocks_in_area(player.x, player.y, fov_system.view_distance)
-    # rays, hit_blocks = fov_system.calculate_rays(player_pos, mouse_pos=mouse_pos)
+        # Draw blocks only in visible area
+        visible_blocks = camera.query(block_grid)
+        for block in visible_blocks:
+            pygame.draw.rect(window, (255, 255, 255), camera.apply(block))
+        # Calculate FOV with optimized ray count
+        # visible_blocks = fov_system._get_blocks_in_area(player.x, player.y, fov_system.view_distance)
+        # rays, hit_blocks = fov_system.calculate_rays(player_pos, mouse_pos=mouse_pos)
     
-    pygame.draw.rect(window, (255,0,0), enemy.rect)
-    # Optimized lighting
-    # lighting = fov_system.create_combined_lighting((HEIGHT, WIDTH), rays, player_pos, 500, 100)
-    # window.blit(lighting, (0, 0))
-    # player_center = (player.x + player.player_size//2, player.y + player.player_size//2)
-    # Draw blocks (walls)
-
-    mouse_pos = pygame.mouse.get_pos()
-    fovray = player.getFOVPolygon((WINDOW_WIDTH, WINDOW_HEIGHT))
-    window.blit(fovray)
-    player.update(window, moving=moving, dt=dt, blocks=blocks, lookingPoint=mouse_pos)
-    if not player.is_target_visible(enemy.rect):
-        enemy.update((player.x,player.y))
-    # For debugging: draw rays (set to True to visualize)
-    if False:
-        for start, end in rays:
-            pygame.draw.line(window, (255, 255, 0, 50), start, end, 1)
+        # Enemies off screen stay dormant, so AI cost is bounded by the view
+        active_enemies = camera.query(enemy_grid)
+        for enemy in active_enemies:
+            pygame.draw.rect(window, (255,0,0), camera.apply(enemy.rect))
+        # Optimized lighting
+        # lighting = fov_system.create_combined_lighting((HEIGHT, WIDTH), rays, player_pos, 500, 100)
+        # window.blit(lighting, (0, 0))
+        # player_center = (player.x + player.player_size//2, player.y + player.player_size//2)
+        # Draw blocks (walls)
+
+        mouse_pos = camera.screen_to_world(pygame.mouse.get_pos())
+        if recorder is not None:
+            recorder.record(moving, mouse_pos, dt)
+        # Collide against blocks around the player, not the view, so physics doesn't depend on the camera
+        # (64px covers the furthest a player can move in one clamped frame)
+        nearby_blocks = block_grid.query_rect(player.playerRect.inflate(64, 64))
+        player.update(window, moving=moving, dt=dt, blocks=nearby_blocks, lookingPoint=mouse_pos, offset=camera.offset)
+        player_center = (player.x + player.player_size//2, player.y + player.player_size//2)
+        pipeline.submit(VisibilitySnapshot(frame, player_center, player.facing_angle,
+                                           {id(enemy): tuple(enemy.rect) for enemy in active_enemies}))
+        visibility = pipeline.result(frame)
+        rays = [(camera.world_to_screen(start), camera.world_to_screen(end)) for start, end in visibility.rays]
+        lighting = light_system.create_combined_lighting((WINDOW_WIDTH, WINDOW_HEIGHT), rays, camera.world_to_screen(visibility.origin),
+                                                         facing_angle=visibility.facing_angle)
+        window.blit(lighting, (0, 0))
+        # All separation neighbors from one pass over the grid cells on screen
+        enemy_neighbors = enemy_grid.neighbor_lists(TILE_SIZE, camera.view_rect)
+        for enemy in active_enemies:
+            if not visibility.targets_visible.get(id(enemy), False):
+                enemy.update((player.x,player.y),
+                             blocks=block_grid.query_rect(enemy.rect.inflate(4, 4)),
+                             neighbors=enemy_neighbors.get(id(enemy)))
+                enemy_grid.update(enemy, enemy.rect)
+        # For debugging: draw rays (set to True to visualize)
+        if False:
+            for start, end in rays:
+                pygame.draw.line(window, (255, 255, 0, 50), start, end, 1)
     
-    # Update display
-    pygame.display.flip()
+        # Update display
+        pygame.display.flip()
     
-    # Frame rate control
-    dt = max(0.001, min(0.1, clock.tick(FPS) / 1000))
-
+        # Frame rate control
+        dt = max(0.001, min(0.1, clock.tick(FPS) / 1000))
+        frame += 1
+finally:
+    # Always release the worker (and its shared memory) and flush the recording
+    pipeline.close()
+    if recorder is not None:
+        recorder.close()
 pygame.quit()
\ No newline at end of file
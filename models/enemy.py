@@ -1,17 +1,57 @@
+import itertools
+import math
 import pygame
 
+# Creation order, breaks ties between enemies on the exact same spot the same way every run
+_creation_order = itertools.count()
+
 class Enemy:
     def __init__(self, x, y, tile_size):
+        self.order = next(_creation_order)
         self.tile_size = tile_size
         self.x = x
         self.y = y
         self.rect = pygame.Rect(x, y, tile_size, tile_size)
 
-    def update(self, playerPos: tuple[int,int]):
-        toVector = pygame.math.Vector2.normalize(pygame.math.Vector2((playerPos[0] - self.x, playerPos[1] - self.y)))
+    def update(self, playerPos: tuple[int,int], blocks: list[pygame.Rect] = None, neighbors: list["Enemy"] = None):
+        toVector = pygame.math.Vector2((playerPos[0] - self.x, playerPos[1] - self.y))
+        if toVector.length_squared() > 0:
+            toVector.normalize_ip()
+
+        # Separation: push away from enemies closer than a tile, stronger the closer they are
+        # (plain floats, this runs for every neighbor of every enemy)
+        if neighbors:
+            push_x = push_y = 0.0
+            for other in neighbors:
+                away_x = self.x - other.x
+                away_y = self.y - other.y
+                distance = math.hypot(away_x, away_y)
+                if distance == 0:
+                    # Stacked (e.g. snapped to the same wall corner): split them along x
+                    push_x += 1 if self.order < other.order else -1
+                elif distance < self.tile_size:
+                    weight = (1 - distance / self.tile_size) / distance
+                    push_x += away_x * weight
+                    push_y += away_y * weight
+            toVector.x += push_x
+            toVector.y += push_y
+            if toVector.length_squared() > 1:
+                toVector.normalize_ip()
+
         self.x += toVector.x
         self.rect.x = self.x
+        if blocks:
+            collision_idx = self.rect.collidelist(blocks)
+            if collision_idx != -1:
+                block = blocks[collision_idx]
+                self.x = block.left - self.tile_size if toVector.x > 0 else block.right
+                self.rect.x = self.x
 
         self.y += toVector.y
         self.rect.y = self.y
-
+        if blocks:
+            collision_idx = self.rect.collidelist(blocks)
+            if collision_idx != -1:
+                block = blocks[collision_idx]
+                self.y = block.top - self.tile_size if toVector.y > 0 else block.bottom
+                self.rect.y = self.y
@@ -15,7 +15,7 @@ class Player:
         self.lookingPoint = (0,0)
         self.facing_angle = math.atan2(self.lookingPoint[1] - self.y, self.lookingPoint[0] - self.x) 
     
-    def update(self, screen, moving, dt, blocks: list[pygame.Rect], lookingPoint: tuple[int,int]):
+    def update(self, screen, moving, dt, blocks: list[pygame.Rect], lookingPoint: tuple[int,int], offset: tuple[int,int]=(0,0)):
 
         dx = moving["right"] - moving["left"]
         dy = moving["down"] - moving["up"]
@@ -63,12 +63,12 @@ class Player:
         self.lookingPoint = lookingPoint
         self.facing_angle = math.atan2(self.lookingPoint[1] - self.y, self.lookingPoint[0] - self.x)
 
-        self.draw(screen)
+        self.draw(screen, offset)
     
-    def draw(self, screen):
-        pygame.draw.rect(screen, (255, 255, 255), self.playerRect)
+    def draw(self, screen, offset: tuple[int,int]=(0,0)):
+        pygame.draw.rect(screen, (255, 255, 255), self.playerRect.move(-offset[0], -offset[1]))
     
     def is_target_visible(self,target):
         return self.fov_system.is_visible((self.x + (self.player_size//2), self.y + (self.player_size // 2)), target, self.facing_angle)
-    def getFOVPolygon(self, size: tuple[int,int]):
-        return self.fov_system.draw_fov_polygon(size,(self.x + (self.player_size//2), self.y + (self.player_size // 2)), self.facing_angle)
+    def getFOVPolygon(self, size: tuple[int,int], offset: tuple[int,int]=(0,0)):
+        return self.fov_system.draw_fov_polygon(size,(self.x + (self.player_size//2) - offset[0], self.y + (self.player_size // 2) - offset[1]), self.facing_angle)
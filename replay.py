@@ -0,0 +1,279 @@
+import argparse
+import cProfile
+import os
+import pstats
+import random
+import struct
+import time
+import pygame
+
+from camera import Camera
+from fov_systems import RadialFOVSystem
+from level import load_blocks
+from light import LightSystem, PLAYER_LIGHT_SETTINGS
+from models.enemy import Enemy
+from models.player import Player
+from spatial_grid import SpatialGrid
+from visibility_pipeline import VisibilityPipeline, VisibilitySnapshot
+
+# File layout (little endian):
+#   header: magic, version, seed, window size, tile size, player start, enemy count,
+#           visibility pipeline mode and lag (frames)
+#   enemy starts: enemy count * (x, y)
+#   level path: length-prefixed utf-8
+#   frames until EOF: moving bitmask, mouse world x/y, dt (double, so replayed physics match exactly)
+MAGIC = b"PHRP"
+VERSION = 2
+_HEADER = struct.Struct("<4sBQHHHffHBB")
+_POINT = struct.Struct("<ff")
+_PATH_LEN = struct.Struct("<H")
+_FRAME = struct.Struct("<Bffd")
+# Frames buffered before they're pushed to the OS (one second at 60 FPS)
+FLUSH_INTERVAL = 60
+
+MOVE_KEYS = ("left", "right", "up", "down")
+# Index stored in the header; None is from before main.py always used a pipeline,
+# and replays like sync (no lag, same visibility checks)
+PIPELINE_MODES = (None, "sync", "thread", "process")
+
+
+def pack_moving(moving: dict) -> int:
+    mask = 0
+    for bit, key in enumerate(MOVE_KEYS):
+        if moving[key]:
+            mask |= 1 << bit
+    return mask
+
+
+def unpack_moving(mask: int) -> dict:
+    return {key: bool(mask & (1 << bit)) for bit, key in enumerate(MOVE_KEYS)}
+
+
+class InputRecorder:
+    def __init__(self, path: str, seed: int, window_size: tuple[int, int], tile_size: int,
+                 level_path: str, player_start: tuple[float, float],
+                 enemy_starts: list[tuple[float, float]], pipeline_mode: str = None,
+                 pipeline_lag: int = 0):
+        """
+        Streams per-frame input to a compact binary file.
+
+        Frames are appended as they happen and flushed every FLUSH_INTERVAL
+        frames, so a process killed outright (e.g. SIGKILL) loses
+        at most the last FLUSH_INTERVAL - 1 frames. An exception in the game
+        loop loses nothing as long as close() is called.
+        """
+        self.frame_count = 0
+        self._file = open(path, 'wb')
+        self._file.write(_HEADER.pack(MAGIC, VERSION, seed, window_size[0], window_size[1],
+                                      tile_size, player_start[0], player_start[1], len(enemy_starts),
+                                      PIPELINE_MODES.index(pipeline_mode), pipeline_lag))
+        for pos in enemy_starts:
+            self._file.write(_POINT.pack(*pos))
+        encoded_path = level_path.encode("utf-8")
+        self._file.write(_PATH_LEN.pack(len(encoded_path)))
+        self._file.write(encoded_path)
+        self._file.flush()
+
+    def record(self, moving: dict, mouse_pos: tuple[float, float], dt: float):
+        self._file.write(_FRAME.pack(pack_moving(moving), mouse_pos[0], mouse_pos[1], dt))
+        self.frame_count += 1
+        if self.frame_count % FLUSH_INTERVAL == 0:
+            self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class Recording:
+    def __init__(self, seed: int, window_size: tuple[int, int], tile_size: int, level_path: str,
+                 player_start: tuple[float, float], enemy_starts: list[tuple[float, float]],
+                 frames: list[tuple[dict, tuple[float, float], float]],
+                 pipeline_mode: str = None, pipeline_lag: int = 0):
+        self.seed = seed
+        self.window_size = window_size
+        self.tile_size = tile_size
+        self.level_path = level_path
+        self.player_start = player_start
+        self.enemy_starts = enemy_starts
+        self.frames = frames
+        self.pipeline_mode = pipeline_mode
+        self.pipeline_lag = pipeline_lag
+
+    @classmethod
+    def load(cls, path: str) -> "Recording":
+        with open(path, 'rb') as file:
+            data = file.read()
+        magic, version = struct.unpack_from("<4sB", data, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a recording")
+        if version != VERSION:
+            raise ValueError(f"Unsupported recording version {version}")
+        (_, _, seed, width, height, tile_size, px, py, enemy_count,
+         pipeline_index, pipeline_lag) = _HEADER.unpack_from(data, 0)
+        offset = _HEADER.size
+        enemy_starts = []
+        for _ in range(enemy_count):
+            enemy_starts.append(_POINT.unpack_from(data, offset))
+            offset += _POINT.size
+        (path_len,) = _PATH_LEN.unpack_from(data, offset)
+        offset += _PATH_LEN.size
+        level_path = data[offset:offset + path_len].decode("utf-8")
+        offset += path_len
+
+        frames = []
+        # A trailing partial frame (crash mid-write) is ignored
+        while offset + _FRAME.size <= len(data):
+            mask, mx, my, dt = _FRAME.unpack_from(data, offset)
+            frames.append((unpack_moving(mask), (mx, my), dt))
+            offset += _FRAME.size
+        return cls(seed, (width, height), tile_size, level_path, (px, py), enemy_starts, frames,
+                   PIPELINE_MODES[pipeline_index], pipeline_lag)
+
+
+class ReplayRunner:
+    def __init__(self, recording: Recording):
+        """
+        Re-runs a recording headlessly, mirroring the frame logic of main.py.
+
+        Visibility always goes through a sync pipeline with the recording's
+        fixed lag, which gives the same results as the threaded or process
+        worker did, with the same lighting work.
+
+        Args:
+            recording: Loaded input recording
+        """
+        self.recording = recording
+        random.seed(recording.seed)
+
+        self.size = recording.window_size
+        self.screen = pygame.Surface(self.size)
+        self.blocks = load_blocks(recording.level_path, recording.tile_size)
+        self.block_grid = SpatialGrid(recording.tile_size * 4)
+        for block in self.blocks:
+            self.block_grid.insert(block, block)
+
+        self.player = Player(recording.player_start[0], recording.player_start[1], RadialFOVSystem(90, 90))
+        self.enemies = [Enemy(x, y, recording.tile_size) for x, y in recording.enemy_starts]
+        self.enemy_grid = SpatialGrid(recording.tile_size * 4)
+        for enemy in self.enemies:
+            self.enemy_grid.insert(enemy, enemy.rect)
+
+        world_rect = pygame.Rect(0, 0, *self.size)
+        if self.blocks:
+            world_rect = world_rect.unionall(self.blocks)
+        self.camera = Camera(self.size[0], self.size[1], world_rect)
+        self.camera.center_on(self.player.playerRect.center)
+
+        self.fov_system = self.player.fov_system
+        self.light_system = LightSystem(blocks=self.blocks, **PLAYER_LIGHT_SETTINGS)
+        self.pipeline = VisibilityPipeline(self.light_system, self.fov_system, mode="sync",
+                                           max_staleness=recording.pipeline_lag, fixed_lag=True)
+        self.frame = 0
+        self.ray_mismatches = 0
+
+    def step(self, moving: dict, mouse_pos: tuple[float, float], dt: float):
+        """Simulate one recorded frame"""
+        self.screen.fill((0, 0, 0))
+        self.camera.follow(self.player.playerRect.center, dt)
+        for block in self.camera.query(self.block_grid):
+            pygame.draw.rect(self.screen, (255, 255, 255), self.camera.apply(block))
+        active_enemies = self.camera.query(self.enemy_grid)
+        for enemy in active_enemies:
+            pygame.draw.rect(self.screen, (255, 0, 0), self.camera.apply(enemy.rect))
+
+        player = self.player
+        nearby_blocks = self.block_grid.query_rect(player.playerRect.inflate(64, 64))
+        player.update(self.screen, moving=moving, dt=dt, blocks=nearby_blocks,
+                      lookingPoint=mouse_pos, offset=self.camera.offset)
+        player_center = (player.x + player.player_size//2, player.y + player.player_size//2)
+        self.pipeline.submit(VisibilitySnapshot(self.frame, player_center, player.facing_angle,
+                                                {id(enemy): tuple(enemy.rect) for enemy in active_enemies}))
+        visibility = self.pipeline.result(self.frame)
+        rays = [(self.camera.world_to_screen(start), self.camera.world_to_screen(end)) for start, end in visibility.rays]
+        lighting = self.light_system.create_combined_lighting(self.size, rays, self.camera.world_to_screen(visibility.origin),
+                                                              facing_angle=visibility.facing_angle)
+        self.screen.blit(lighting, (0, 0))
+        enemy_neighbors = self.enemy_grid.neighbor_lists(self.recording.tile_size, self.camera.view_rect)
+        for enemy in active_enemies:
+            if not visibility.targets_visible.get(id(enemy), False):
+                enemy.update((self.player.x, self.player.y),
+                             blocks=self.block_grid.query_rect(enemy.rect.inflate(4, 4)),
+                             neighbors=enemy_neighbors.get(id(enemy)))
+                self.enemy_grid.update(enemy, enemy.rect)
+        self.frame += 1
+
+    def check_rays(self) -> int:
+        """Rays of the last frame whose reused (incremental) end differs from a fresh cast"""
+        if not self.light_system.incremental:
+            return 0
+        return len(self.light_system.check_incremental())
+
+    def run(self, profile_frame: int = None, check_rays: bool = False) -> list[float]:
+        """
+        Replay every frame as fast as possible.
+
+        Args:
+            profile_frame: Optional frame index to run under cProfile
+            check_rays: After every frame, recast the lit rays from scratch and count
+                the ones incremental ray casting got wrong (outside the timings)
+
+        Returns:
+            Per-frame wall times in seconds
+        """
+        self.ray_mismatches = 0
+        timings = []
+        for index, (moving, mouse_pos, dt) in enumerate(self.recording.frames):
+            if index == profile_frame:
+                profiler = cProfile.Profile()
+                start = time.perf_counter()
+                profiler.enable()
+                self.step(moving, mouse_pos, dt)
+                profiler.disable()
+                timings.append(time.perf_counter() - start)
+                pstats.Stats(profiler).sort_stats("cumulative").print_stats(25)
+            else:
+                start = time.perf_counter()
+                self.step(moving, mouse_pos, dt)
+                timings.append(time.perf_counter() - start)
+            if check_rays:
+                self.ray_mismatches += self.check_rays()
+        return timings
+
+
+def format_report(timings: list[float], worst: int = 5) -> str:
+    if not timings:
+        return "No frames recorded"
+    ordered = sorted(timings)
+
+    def percentile(p):
+        return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))] * 1000
+
+    total = sum(timings)
+    lines = [
+        f"frames: {len(timings)}  total: {total:.3f}s  ({len(timings) / total:.1f} frames/s)",
+        f"mean: {total / len(timings) * 1000:.3f}ms  p50: {percentile(50):.3f}ms  "
+        f"p95: {percentile(95):.3f}ms  p99: {percentile(99):.3f}ms  max: {ordered[-1] * 1000:.3f}ms",
+        "worst frames:",
+    ]
+    slowest = sorted(range(len(timings)), key=timings.__getitem__, reverse=True)[:worst]
+    for index in slowest:
+        lines.append(f"  #{index}: {timings[index] * 1000:.3f}ms")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay a recorded session headlessly and time each frame")
+    parser.add_argument("recording", help="Recording written by main.py --record")
+    parser.add_argument("--profile-frame", type=int, help="Run this frame under cProfile")
+    parser.add_argument("--worst", type=int, default=5, help="How many of the slowest frames to list")
+    parser.add_argument("--check-rays", action="store_true",
+                        help="Check every incremental ray against a fresh cast")
+    args = parser.parse_args()
+
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    pygame.init()
+    runner = ReplayRunner(Recording.load(args.recording))
+    print(format_report(runner.run(profile_frame=args.profile_frame, check_rays=args.check_rays), worst=args.worst))
+    if args.check_rays:
+        print(f"incremental rays off from a fresh cast: {runner.ray_mismatches}")
+    pygame.quit()
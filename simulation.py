@@ -0,0 +1,238 @@
+import argparse
+import math
+import multiprocessing
+import os
+import random
+import time
+from typing import Callable, List, Tuple
+import pygame
+
+from fov_systems import RadialFOVSystem
+from level import load_blocks
+from light import LightSystem
+from models.enemy import Enemy
+from models.player import Player
+from spatial_grid import SpatialGrid
+
+TILE_SIZE = 16
+STEP_DT = 1 / 60
+# Smallest world, same as main.py's window
+MIN_WORLD_SIZE = (640, 360)
+
+# An action is (move_x, move_y, look_x, look_y) with move components in {-1, 0, 1}
+Action = Tuple[int, int, float, float]
+
+
+class GameEnv:
+    def __init__(self, blocks: List[pygame.Rect], world_rect: pygame.Rect = None,
+                 enemy_count: int = 1, use_light_system: bool = False, max_steps: int = 3600,
+                 seed: int = None):
+        """
+        Headless game session driven one fixed step at a time.
+
+        Args:
+            blocks: Level geometry, only read (safe to share between environments)
+            world_rect: Area the player and enemies spawn in, defaults to the
+                level's bounds (at least MIN_WORLD_SIZE, like main.py)
+            enemy_count: Enemies spawned on reset
+            use_light_system: Also ray cast the lit area with LightSystem each step
+            max_steps: Steps before an episode ends on its own
+            seed: Seed for spawn positions
+        """
+        self.blocks = blocks
+        if world_rect is None:
+            world_rect = pygame.Rect(0, 0, *MIN_WORLD_SIZE)
+            if blocks:
+                world_rect = world_rect.unionall(blocks)
+        self.world_rect = world_rect
+        self.enemy_count = enemy_count
+        self.max_steps = max_steps
+        self.rng = random.Random(seed)
+
+        self.block_grid = SpatialGrid(TILE_SIZE * 4)
+        for block in blocks:
+            self.block_grid.insert(block, block)
+        self.fov_system = RadialFOVSystem(90, 90)
+        self.light_system = None
+        if use_light_system:
+            self.light_system = LightSystem(blocks=blocks, view_distance=self.fov_system.view_distance,
+                                            grid_size=TILE_SIZE * 4, soft_light=False, incremental=True)
+        # Player.update always draws, so give it somewhere cheap to draw to
+        self._screen = pygame.Surface((1, 1))
+        self.player = None
+        self.enemies = []
+        self.enemy_grid = SpatialGrid(TILE_SIZE * 4)
+        self.steps = 0
+
+    def _free_position(self, size: int, avoid: Tuple[float, float] = None) -> Tuple[int, int]:
+        """Random spot in the world not inside a block (and not within 4 tiles of avoid)"""
+        for _ in range(100):
+            x = self.rng.randrange(self.world_rect.left, self.world_rect.right - size)
+            y = self.rng.randrange(self.world_rect.top, self.world_rect.bottom - size)
+            if avoid is not None and math.dist((x, y), avoid) <= TILE_SIZE * 4:
+                continue
+            if not self.block_grid.query_rect(pygame.Rect(x, y, size, size)):
+                return x, y
+        raise RuntimeError(f"No free {size}px spawn position found in {self.world_rect}")
+
+    def reset(self, seed: int = None) -> dict:
+        if seed is not None:
+            self.rng.seed(seed)
+        self.steps = 0
+        x, y = self._free_position(16)
+        self.player = Player(x, y, self.fov_system)
+        self.enemies = []
+        self.enemy_grid.clear()
+        for _ in range(self.enemy_count):
+            ex, ey = self._free_position(TILE_SIZE, avoid=(x, y))
+            enemy = Enemy(ex, ey, TILE_SIZE)
+            self.enemies.append(enemy)
+            self.enemy_grid.insert(enemy, enemy.rect)
+        return self._observe(self._enemies_visible())
+
+    def step(self, action: Action) -> Tuple[dict, bool]:
+        """
+        Advance one fixed step.
+
+        Returns:
+            Observation after the step
+            Whether the episode ended (caught by an enemy or out of steps)
+        """
+        move_x, move_y, look_x, look_y = action
+        moving = {"left": move_x < 0, "right": move_x > 0, "up": move_y < 0, "down": move_y > 0}
+        nearby_blocks = self.block_grid.query_rect(self.player.playerRect.inflate(64, 64))
+        self.player.update(self._screen, moving=moving, dt=STEP_DT, blocks=nearby_blocks, lookingPoint=(look_x, look_y))
+
+        # Contact through the broad phase instead of testing every enemy
+        caught = bool(self.enemy_grid.query_rect(self.player.playerRect))
+        # is_target_visible is the most expensive per-enemy call, so it runs once
+        # per step and the observation reports what the enemies acted on
+        enemies_visible = self._enemies_visible()
+        enemy_neighbors = self.enemy_grid.neighbor_lists(TILE_SIZE)
+        for enemy, visible in zip(self.enemies, enemies_visible):
+            if not visible:
+                enemy.update((self.player.x, self.player.y),
+                             blocks=self.block_grid.query_rect(enemy.rect.inflate(4, 4)),
+                             neighbors=enemy_neighbors.get(id(enemy)))
+                self.enemy_grid.update(enemy, enemy.rect)
+        self.steps += 1
+        return self._observe(enemies_visible), caught or self.steps >= self.max_steps
+
+    def _enemies_visible(self) -> List[bool]:
+        return [self.player.is_target_visible(enemy.rect) for enemy in self.enemies]
+
+    def _observe(self, enemies_visible: List[bool]) -> dict:
+        player = self.player
+        observation = {
+            "player": (player.x, player.y),
+            "facing": player.facing_angle,
+            "enemies": [(enemy.x, enemy.y) for enemy in self.enemies],
+            "enemies_visible": enemies_visible,
+        }
+        if self.light_system is not None:
+            center = player.playerRect.center
+            rays, visible_blocks = self.light_system.calculate_rays(center, facing_angle=player.facing_angle)
+            observation["ray_ends"] = [end for _, end in rays]
+            observation["visible_blocks"] = len(visible_blocks)
+        return observation
+
+
+def random_policy(observation: dict, rng: random.Random) -> Action:
+    """Wander and look around at random"""
+    x, y = observation["player"]
+    angle = rng.uniform(-math.pi, math.pi)
+    return (rng.choice((-1, 0, 1)), rng.choice((-1, 0, 1)), x + math.cos(angle) * 50, y + math.sin(angle) * 50)
+
+
+# Per-worker state, set once by the pool initializer so level geometry isn't
+# pickled with every task (and is shared copy-on-write where the pool forks)
+_worker_blocks = None
+_worker_env_settings = None
+
+
+def _init_worker(block_rects: List[Tuple[int, int, int, int]], env_settings: dict):
+    global _worker_blocks, _worker_env_settings
+    _worker_blocks = [pygame.Rect(rect) for rect in block_rects]
+    _worker_env_settings = env_settings
+
+
+def _run_env(seed: int, steps: int, policy: Callable) -> Tuple[int, int, float]:
+    """Run one environment for a number of steps, resetting when episodes end"""
+    env = GameEnv(_worker_blocks, seed=seed, **_worker_env_settings)
+    rng = random.Random(seed)
+    observation = env.reset()
+    episodes = 1
+    start = time.perf_counter()
+    for _ in range(steps):
+        observation, done = env.step(policy(observation, rng))
+        if done:
+            observation = env.reset()
+            episodes += 1
+    return steps, episodes, time.perf_counter() - start
+
+
+class RunReport:
+    def __init__(self, total_steps: int, episodes: int, wall_time: float, env_time: float):
+        self.total_steps = total_steps
+        self.episodes = episodes
+        self.wall_time = wall_time
+        self.env_time = env_time
+
+    @property
+    def steps_per_second(self) -> float:
+        return self.total_steps / self.wall_time if self.wall_time > 0 else 0.0
+
+    def __str__(self):
+        return (f"{self.total_steps} steps, {self.episodes} episodes in {self.wall_time:.2f}s "
+                f"({self.steps_per_second:.0f} steps/s aggregate, {self.env_time:.2f}s inside environments)")
+
+
+class VectorizedRunner:
+    def __init__(self, blocks: List[pygame.Rect], env_count: int, workers: int = None, **env_settings):
+        """
+        Runs many GameEnvs spread across a process pool.
+
+        Args:
+            blocks: Level geometry, sent to each worker once
+            env_count: Number of independent environments
+            workers: Pool size (defaults to the CPU count)
+            env_settings: Passed through to GameEnv
+        """
+        self.env_count = env_count
+        self.workers = workers or os.cpu_count() or 1
+        self._pool = multiprocessing.Pool(self.workers, initializer=_init_worker,
+                                          initargs=([tuple(block) for block in blocks], env_settings))
+
+    def run(self, steps: int, policy: Callable = random_policy, seed: int = 0) -> RunReport:
+        """
+        Step every environment the given number of times.
+
+        Args:
+            steps: Steps per environment
+            policy: Module-level (picklable) function of (observation, rng) -> action
+            seed: Base seed, environment i uses seed + i
+        """
+        start = time.perf_counter()
+        results = self._pool.starmap(_run_env, [(seed + i, steps, policy) for i in range(self.env_count)])
+        wall_time = time.perf_counter() - start
+        return RunReport(sum(r[0] for r in results), sum(r[1] for r in results), wall_time, sum(r[2] for r in results))
+
+    def close(self):
+        self._pool.close()
+        self._pool.join()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run headless game sessions on a process pool")
+    parser.add_argument("--level", default="levels/map.json")
+    parser.add_argument("--envs", type=int, default=16)
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--steps", type=int, default=1000, help="Steps per environment")
+    parser.add_argument("--enemies", type=int, default=1)
+    parser.add_argument("--light", action="store_true", help="Ray cast with LightSystem every step")
+    args = parser.parse_args()
+
+    runner = VectorizedRunner(load_blocks(args.level, TILE_SIZE), args.envs, args.workers,
+                              enemy_count=args.enemies, use_light_system=args.light)
+    print(runner.run(args.steps))
+    runner.close()
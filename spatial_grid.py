@@ -0,0 +1,199 @@
+from collections import defaultdict
+import pygame
+
+
+class SpatialGrid:
+    """Uniform grid that buckets arbitrary items by their bounding rect.
+
+    Items are tracked by identity, so unhashable objects such as
+    pygame.Rect can be stored directly. Also serves as the broad phase
+    for moving entities: update() only touches buckets when an item
+    changes cells, and pairs_within()/neighbor_lists() find every
+    close pair in one pass for separation, contact and proximity checks.
+    """
+    def __init__(self, cell_size: int = 64):
+        self.cell_size = cell_size
+        self.cells: dict[tuple[int, int], list] = {}
+        # id(item) -> [item, rect, cell range]
+        self._items: dict[int, list] = {}
+        # Largest width/height inserted so far, bounds how far apart a pair's top-left corners can be
+        self._max_extent = 0
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, item):
+        return id(item) in self._items
+
+    def _cell_range(self, rect: pygame.Rect) -> tuple[int, int, int, int]:
+        """Grid cells covered by a rect as (min_gx, min_gy, max_gx, max_gy)"""
+        cell_size = self.cell_size
+        min_gx = rect.left // cell_size
+        min_gy = rect.top // cell_size
+        max_gx = max(min_gx, (rect.right - 1) // cell_size)
+        max_gy = max(min_gy, (rect.bottom - 1) // cell_size)
+        return min_gx, min_gy, max_gx, max_gy
+
+    def _add_to_cells(self, item, cell_range):
+        min_gx, min_gy, max_gx, max_gy = cell_range
+        for gx in range(min_gx, max_gx + 1):
+            for gy in range(min_gy, max_gy + 1):
+                key = (gx, gy)
+                if key not in self.cells:
+                    self.cells[key] = []
+                self.cells[key].append(item)
+
+    def _remove_from_cells(self, item, cell_range):
+        min_gx, min_gy, max_gx, max_gy = cell_range
+        for gx in range(min_gx, max_gx + 1):
+            for gy in range(min_gy, max_gy + 1):
+                key = (gx, gy)
+                bucket = self.cells[key]
+                for i, other in enumerate(bucket):
+                    if other is item:
+                        bucket.pop(i)
+                        break
+                if not bucket:
+                    del self.cells[key]
+
+    def insert(self, item, rect: pygame.Rect):
+        """Add an item covering rect (re-inserting an item moves it)"""
+        if id(item) in self._items:
+            self.remove(item)
+        rect = pygame.Rect(rect)
+        cell_range = self._cell_range(rect)
+        self._items[id(item)] = [item, rect, cell_range]
+        self._add_to_cells(item, cell_range)
+        self._max_extent = max(self._max_extent, rect.width, rect.height)
+
+    def remove(self, item):
+        entry = self._items.pop(id(item), None)
+        if entry is not None:
+            self._remove_from_cells(item, entry[2])
+
+    def update(self, item, rect: pygame.Rect):
+        """Move an item to its new bounding rect, re-bucketing only if its cells changed"""
+        entry = self._items.get(id(item))
+        if entry is None:
+            self.insert(item, rect)
+            return
+        stored = entry[1]
+        stored.update(rect)
+        cell_range = self._cell_range(stored)
+        old_range = entry[2]
+        if cell_range != old_range:
+            self._remove_from_cells(item, old_range)
+            self._add_to_cells(item, cell_range)
+            entry[2] = cell_range
+        if stored.width > self._max_extent or stored.height > self._max_extent:
+            self._max_extent = max(stored.width, stored.height)
+
+    def clear(self):
+        self.cells = {}
+        self._items = {}
+        self._max_extent = 0
+
+    def rect_of(self, item) -> pygame.Rect:
+        """Bounding rect the item was last inserted with"""
+        return self._items[id(item)][1]
+
+    def query_rect(self, rect: pygame.Rect) -> list:
+        """Items whose bounding rect overlaps rect, without duplicates"""
+        min_gx, min_gy, max_gx, max_gy = self._cell_range(rect)
+        seen = set()
+        found = []
+        for gx in range(min_gx, max_gx + 1):
+            for gy in range(min_gy, max_gy + 1):
+                bucket = self.cells.get((gx, gy))
+                if not bucket:
+                    continue
+                for item in bucket:
+                    if id(item) in seen:
+                        continue
+                    seen.add(id(item))
+                    if rect.colliderect(self._items[id(item)][1]):
+                        found.append(item)
+        return found
+
+    def neighbors(self, item, radius: int = 0) -> list:
+        """Other items whose rect comes within radius pixels of item's rect"""
+        rect = self._items[id(item)][1]
+        return [other for other in self.query_rect(rect.inflate(radius * 2, radius * 2)) if other is not item]
+
+    def pairs_within(self, radius: int = 0, rect: pygame.Rect = None) -> list:
+        """
+        Every pair of items whose rects come within radius pixels of each other, each reported once.
+
+        One batched pass over the grid's cells instead of a query per item.
+        Each item takes part once, from the cell holding its top-left corner,
+        and each cell is compared with itself and the forward half of its
+        neighborhood, so every pair of cells is visited once.
+
+        Args:
+            radius: Gap (pixels) at which two items count as neighbors, 0 for overlapping pairs
+            rect: Only search cells around this area (e.g. the camera view). Every pair
+                involving an item inside it is found, plus some just outside it
+        """
+        cells = self.cells
+        # How many cells apart the top-left corners of two items within radius can be
+        span = -(-(self._max_extent + radius) // self.cell_size)
+        offsets = [(dx, 0) for dx in range(1, span + 1)]
+        offsets += [(dx, dy) for dy in range(1, span + 1) for dx in range(-span, span + 1)]
+
+        if rect is None:
+            entries = self._items.values()
+        else:
+            # Items in the area have their corner up to span cells before it, and their
+            # pairs are visited from up to span cells before (or right of) that corner
+            min_gx, min_gy, max_gx, max_gy = self._cell_range(rect)
+            visit = (min_gx - 2 * span, min_gy - 2 * span, max_gx + span, max_gy)
+            # Plus the forward neighborhood of those cells
+            entries = []
+            for gx in range(visit[0] - span, visit[2] + span + 1):
+                for gy in range(visit[1], visit[3] + span + 1):
+                    for item in cells.get((gx, gy), ()):
+                        entry = self._items[id(item)]
+                        if entry[2][0] == gx and entry[2][1] == gy:
+                            entries.append(entry)
+
+        # Bounds grown by radius on the right and bottom, by corner cell
+        boxes = {}
+        for item, (x, y, width, height), cell_range in entries:
+            key = (cell_range[0], cell_range[1])
+            box = (item, x, y, x + width + radius, y + height + radius)
+            found = boxes.get(key)
+            if found is None:
+                boxes[key] = [box]
+            else:
+                found.append(box)
+
+        pairs = []
+        for (gx, gy), bucket in boxes.items():
+            if rect is not None and not (visit[0] <= gx <= visit[2] and visit[1] <= gy <= visit[3]):
+                continue
+            near = list(bucket)
+            count = len(near)
+            for dx, dy in offsets:
+                other = boxes.get((gx + dx, gy + dy))
+                if other:
+                    near += other
+            total = len(near)
+            for i in range(count):
+                a, ax, ay, ar, ab = near[i]
+                for j in range(i + 1, total):
+                    b, bx, by, br, bb = near[j]
+                    if ax < br and bx < ar and ay < bb and by < ab:
+                        pairs.append((a, b))
+        return pairs
+
+    def neighbor_lists(self, radius: int = 0, rect: pygame.Rect = None) -> dict[int, list]:
+        """
+        neighbors() for every item at once (or every item inside rect, see
+        pairs_within()), keyed by id(item); items without neighbors are absent
+        """
+        lists = defaultdict(list)
+        for a, b in self.pairs_within(radius, rect):
+            lists[id(a)].append(b)
+            lists[id(b)].append(a)
+        # Plain dict so lookups for items without neighbors give None instead of adding them
+        return dict(lists)
@@ -0,0 +1,365 @@
+import multiprocessing
+import threading
+from collections import deque
+from multiprocessing import shared_memory
+from typing import Dict, List, Tuple
+import pygame
+
+from fov_systems import RadialFOVSystem
+from light import LightSystem
+
+# Upper bound on rays per frame (LightSystem caps its ray count at 200)
+MAX_RAYS = 200
+
+
+class VisibilitySnapshot:
+    def __init__(self, frame: int, origin: Tuple[float, float], facing_angle: float,
+                 targets: Dict[int, Tuple[int, int, int, int]]):
+        """
+        Input for one frame of visibility work.
+
+        Args:
+            frame: Frame number the snapshot was taken on
+            origin: Viewer position in world space
+            facing_angle: Viewer facing (radians)
+            targets: Rects to test for visibility, keyed by caller-chosen ids
+        """
+        self.frame = frame
+        self.origin = origin
+        self.facing_angle = facing_angle
+        self.targets = targets
+
+
+class VisibilityResult:
+    def __init__(self, frame: int, origin: Tuple[float, float], facing_angle: float,
+                 rays: List, visible_blocks: List[int], targets_visible: Dict[int, bool]):
+        self.frame = frame
+        self.origin = origin
+        self.facing_angle = facing_angle
+        self.rays = rays
+        self.visible_blocks = visible_blocks  # indices into the blocks list
+        self.targets_visible = targets_visible
+
+    @property
+    def polygon(self) -> List[Tuple[float, float]]:
+        return [self.origin] + [end for _, end in self.rays]
+
+
+def _light_settings(light_system: LightSystem) -> dict:
+    """Constructor arguments to rebuild an equivalent LightSystem elsewhere"""
+    return {
+        "fov_angle": light_system.fov_angle,
+        "base_ray_count": light_system.base_ray_count,
+        "view_distance": light_system.view_distance,
+        "ray_density": light_system.ray_density,
+        "grid_size": light_system.grid_size,
+        "incremental": light_system.incremental,
+        "reuse_distance": light_system.reuse_distance,
+    }
+
+
+def compute_visibility(light_system: LightSystem, fov_system: RadialFOVSystem,
+                       block_indices: Dict[int, int], snapshot: VisibilitySnapshot) -> VisibilityResult:
+    """Ray cast, build the visibility polygon and test every target for one snapshot"""
+    rays, hit_blocks = light_system.calculate_rays(snapshot.origin, facing_angle=snapshot.facing_angle)
+    targets_visible = {
+        key: fov_system.is_visible(snapshot.origin, pygame.Rect(rect), snapshot.facing_angle)
+        for key, rect in snapshot.targets.items()
+    }
+    return VisibilityResult(snapshot.frame, snapshot.origin, snapshot.facing_angle, rays,
+                            [block_indices[id(block)] for block in hit_blocks], targets_visible)
+
+
+def _process_worker(conn, shm_name: str, block_rects: List[Tuple[int, int, int, int]],
+                    light_settings: dict, fov_settings: dict):
+    """Worker process loop: receive snapshots, write ray ends to shared memory, reply with the rest"""
+    shm = shared_memory.SharedMemory(name=shm_name)
+    buffer = shm.buf.cast("d")
+    blocks = [pygame.Rect(rect) for rect in block_rects]
+    light_system = LightSystem(blocks=blocks, soft_light=False, **light_settings)
+    fov_system = RadialFOVSystem(**fov_settings)
+    block_indices = {id(block): i for i, block in enumerate(blocks)}
+    try:
+        while True:
+            message = conn.recv()
+            if message is None:
+                break
+            frame, origin, facing_angle, targets = message
+            try:
+                result = compute_visibility(light_system, fov_system, block_indices,
+                                            VisibilitySnapshot(frame, origin, facing_angle, targets))
+            except Exception as error:
+                # Report bad input to the caller and keep serving
+                conn.send(error)
+                continue
+            ray_count = min(len(result.rays), MAX_RAYS)
+            for i in range(ray_count):
+                end = result.rays[i][1]
+                buffer[i * 2] = end[0]
+                buffer[i * 2 + 1] = end[1]
+            conn.send((frame, ray_count, result.visible_blocks, result.targets_visible))
+    finally:
+        buffer.release()
+        shm.close()
+
+
+class VisibilityPipeline:
+    def __init__(self, light_system: LightSystem, fov_system: RadialFOVSystem,
+                 mode: str = "thread", max_staleness: int = 1, fixed_lag: bool = False):
+        """
+        Runs ray casting, the visibility polygon and target checks off the main thread.
+
+        Staleness contract: result(frame) returns the newest finished result whose
+        snapshot was taken on frame - max_staleness or later, blocking for the worker
+        if it is further behind. With the default of 1, frame N is drawn with
+        visibility computed from frame N-1's input while frame N's is computed
+        in the background. Only the latest submitted snapshot is kept; older
+        pending ones are dropped.
+
+        With fixed_lag, result(frame) instead returns exactly the result for
+        frame - max_staleness (frame 0 for the first frames) and no snapshot is
+        dropped, so game logic driven by it doesn't depend on thread scheduling
+        and a sync pipeline reproduces it exactly.
+
+        Args:
+            light_system: Ray caster; the worker uses its own copy with the same settings
+            fov_system: Used for target visibility checks
+            mode: "thread" (overlaps with pygame calls that release the GIL),
+                "process" (separate core, ray ends passed through shared memory,
+                falls back to sync where fork isn't available) or "sync"
+                (compute on the calling thread)
+            max_staleness: How many frames old a result may be (0 = always wait)
+            fixed_lag: Always return the result exactly max_staleness frames old
+        """
+        self.light_system = light_system
+        self.fov_system = fov_system
+        self.max_staleness = max_staleness
+        self.fixed_lag = fixed_lag
+        self.mode = mode
+        self._block_indices = {id(block): i for i, block in enumerate(light_system.blocks)}
+        self._latest = None
+        self._results = {}  # frame -> result, only kept with fixed_lag
+        self._pending = deque()
+        self._last_snapshot = None
+        self._errors = {}  # frame -> exception raised computing that frame's snapshot
+        self._closed = False
+
+        if mode == "thread":
+            self._start_thread()
+        elif mode == "process":
+            try:
+                self._start_process()
+            except (OSError, ValueError):
+                # No shared memory or fork on this platform, so compute synchronously
+                self.mode = "sync"
+        elif mode != "sync":
+            raise ValueError(f"Unknown pipeline mode {mode}")
+
+    def _store(self, result: VisibilityResult):
+        self._latest = result
+        if self.fixed_lag:
+            self._results[result.frame] = result
+
+    def _queue(self, snapshot: VisibilitySnapshot):
+        if not self.fixed_lag:
+            self._pending.clear()
+        self._pending.append(snapshot)
+
+    def _start_thread(self):
+        worker_light = LightSystem(blocks=self.light_system.blocks, soft_light=False, **_light_settings(self.light_system))
+        self._condition = threading.Condition()
+        self._busy = False
+        self._running = True
+        self._thread = threading.Thread(target=self._thread_loop, args=(worker_light,), daemon=True)
+        self._thread.start()
+
+    def _thread_loop(self, worker_light: LightSystem):
+        while True:
+            with self._condition:
+                while not self._pending and self._running:
+                    self._condition.wait()
+                if not self._running:
+                    return
+                snapshot = self._pending.popleft()
+                self._busy = True
+            try:
+                result = compute_visibility(worker_light, self.fov_system, self._block_indices, snapshot)
+            except Exception as error:
+                # Hand the failure to result() instead of dying with _busy set
+                with self._condition:
+                    self._errors[snapshot.frame] = error
+                    self._busy = False
+                    self._condition.notify_all()
+                continue
+            with self._condition:
+                self._store(result)
+                self._busy = False
+                self._condition.notify_all()
+
+    def _start_process(self):
+        # fork so the worker doesn't re-import the (unguarded) game script
+        context = multiprocessing.get_context("fork")
+        self._shm = shared_memory.SharedMemory(create=True, size=MAX_RAYS * 2 * 8)
+        self._buffer = self._shm.buf.cast("d")
+        self._conn, child_conn = context.Pipe()
+        self._in_flight = None
+        self._process = context.Process(
+            target=_process_worker,
+            args=(child_conn, self._shm.name, [tuple(block) for block in self.light_system.blocks],
+                  _light_settings(self.light_system),
+                  {"view_distance": self.fov_system.view_distance, "fov_angle": self.fov_system.fov_angle}),
+            daemon=True,
+        )
+        self._process.start()
+
+    def _send_to_process(self, snapshot: VisibilitySnapshot):
+        self._in_flight = snapshot
+        self._conn.send((snapshot.frame, snapshot.origin, snapshot.facing_angle, snapshot.targets))
+
+    def _receive_from_process(self):
+        reply = self._conn.recv()
+        snapshot = self._in_flight
+        self._in_flight = None
+        if isinstance(reply, Exception):
+            self._errors[snapshot.frame] = reply
+        else:
+            frame, ray_count, visible_blocks, targets_visible = reply
+            # Copy out before the next job can overwrite the buffer
+            rays = [(snapshot.origin, (self._buffer[i * 2], self._buffer[i * 2 + 1])) for i in range(ray_count)]
+            self._store(VisibilityResult(frame, snapshot.origin, snapshot.facing_angle, rays, visible_blocks, targets_visible))
+        if self._pending:
+            self._send_to_process(self._pending.popleft())
+
+    def _stop_process(self):
+        """Shut the worker down (or kill it if it doesn't answer) and free the shared memory"""
+        try:
+            if self._in_flight is not None:
+                self._conn.recv()
+            self._conn.send(None)
+        except (EOFError, OSError):
+            pass
+        self._process.join(timeout=1)
+        if self._process.is_alive():
+            self._process.terminate()
+            self._process.join()
+        self._conn.close()
+        self._buffer.release()
+        self._shm.close()
+        self._shm.unlink()
+
+    def _fall_back_to_sync(self):
+        """The worker process died: clean up and compute on the calling thread from now on"""
+        self._stop_process()
+        self._in_flight = None
+        self._pending.clear()
+        self.mode = "sync"
+
+    def _needed_frame(self, frame: int) -> int:
+        """Snapshot frame result(frame) waits for: the exact target, or the newest one submitted"""
+        return self._target_frame(frame) if self.fixed_lag else self._last_snapshot.frame
+
+    def _has_failed(self, frame: int) -> bool:
+        return self._needed_frame(frame) in self._errors
+
+    def _raise_worker_error(self, frame: int):
+        """Raise the error of the snapshot result(frame) needs, if it failed"""
+        self._drop_older_than(self._target_frame(frame))
+        error = self._errors.pop(self._needed_frame(frame), None)
+        if error is not None:
+            raise error
+
+    def submit(self, snapshot: VisibilitySnapshot):
+        """Queue a snapshot for the worker (replacing any that hasn't started yet, unless fixed_lag)"""
+        self._last_snapshot = snapshot
+        if self.mode == "sync":
+            try:
+                self._compute_sync()
+            except Exception as error:
+                self._errors[snapshot.frame] = error
+        elif self.mode == "thread":
+            with self._condition:
+                self._queue(snapshot)
+                self._condition.notify_all()
+        elif self._in_flight is not None:
+            self._queue(snapshot)
+        else:
+            try:
+                self._send_to_process(snapshot)
+            except OSError:
+                self._fall_back_to_sync()
+                self._compute_sync()
+
+    def _target_frame(self, frame: int) -> int:
+        return max(0, frame - self.max_staleness)
+
+    def _is_ready(self, frame: int) -> bool:
+        if self.fixed_lag:
+            return self._target_frame(frame) in self._results
+        return self._latest is not None and self._latest.frame >= frame - self.max_staleness
+
+    def _drop_older_than(self, target: int):
+        """Forget results and failures of frames nothing will ask for again"""
+        for old_frame in [f for f in self._results if f < target]:
+            del self._results[old_frame]
+        for old_frame in [f for f in self._errors if f < target]:
+            del self._errors[old_frame]
+
+    def _ready_result(self, frame: int) -> VisibilityResult:
+        self._drop_older_than(self._target_frame(frame))
+        if not self.fixed_lag:
+            return self._latest
+        return self._results[self._target_frame(frame)]
+
+    def _compute_sync(self) -> VisibilityResult:
+        result = compute_visibility(self.light_system, self.fov_system, self._block_indices, self._last_snapshot)
+        self._store(result)
+        return result
+
+    def result(self, frame: int) -> VisibilityResult:
+        """
+        Result for frame under the staleness contract.
+
+        An exception raised while computing a snapshot is re-raised by the call
+        that needs that snapshot's result (with fixed_lag, result(N + max_staleness)
+        for snapshot N); other calls still get their results. If the worker
+        process dies, the pipeline switches to sync mode and carries on.
+        """
+        if self._last_snapshot is None:
+            raise RuntimeError("submit() a snapshot before asking for a result")
+
+        if self.mode == "thread":
+            with self._condition:
+                while not self._is_ready(frame) and not self._has_failed(frame):
+                    if not self._pending and not self._busy:
+                        break
+                    self._condition.wait()
+                if self._is_ready(frame):
+                    return self._ready_result(frame)
+                self._raise_worker_error(frame)
+        elif self.mode == "process":
+            try:
+                while self._conn.poll():
+                    self._receive_from_process()
+                while not self._is_ready(frame) and self._in_flight is not None and not self._has_failed(frame):
+                    self._receive_from_process()
+            except (EOFError, OSError):
+                self._fall_back_to_sync()
+
+        if self._is_ready(frame):
+            return self._ready_result(frame)
+        self._raise_worker_error(frame)
+        # Nothing fresh enough was submitted (or the worker is gone): compute it here
+        return self._compute_sync()
+
+    def close(self):
+        """Stop the worker and release its resources (safe to call more than once)"""
+        if self._closed:
+            return
+        self._closed = True
+        if self.mode == "thread":
+            with self._condition:
+                self._running = False
+                self._condition.notify_all()
+            self._thread.join()
+        elif self.mode == "process":
+            self._stop_process()